@@ -1,21 +1,25 @@
-import nibabel as nib
-import numpy as np
-from utils.data_processing import validate_nifti, process_vbm_data
-from utils.visualization import create_brain_visualization
-from utils.statistics import generate_statistics_report
+# nibabel, the analysis utils and the database layer pull in nilearn,
+# matplotlib, scipy and sqlalchemy. They are imported where they are used so
+# the Documentation and Literature tabs don't pay for them.
 from utils.api_integration import search_pubmed, search_neurovault, download_neurovault_map, configure_email
-from utils.meta_analysis import perform_ale_analysis, apply_cluster_correction
 import io
 import base64
-from database import init_db, SessionLocal
-from models import Study, BrainMap
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
 from datetime import datetime
 import os
 import streamlit as st
 
 
+@st.cache_resource
+def get_sessionmaker():
+    """Initialize the database once per process and return the session factory"""
+    from database import init_db, SessionLocal
+    init_db()
+    return SessionLocal
+
 # Initialize database
-init_db()
+get_sessionmaker()
 
 # Page configuration
 st.set_page_config(
@@ -28,6 +32,127 @@ st.set_page_config(
 if 'email_configured' not in st.session_state:
     st.session_state.email_configured = False
 
+# Streamlit reruns the whole script on every widget change, so the expensive
+# load/processing steps are cached on the uploaded file's hash. Arguments with
+# a leading underscore are excluded from Streamlit's cache key.
+CACHE_TTL = 24 * 60 * 60
+SEARCH_CACHE_TTL = 60 * 60
+
+HASH_CHUNK_SIZE = 1 << 22
+
+def get_file_hash(uploaded_file):
+    """Return a hex digest identifying the uploaded file's contents"""
+    # The ALE poll reruns the script every half second, so the digest is
+    # remembered for the upload's file_id instead of rehashing each time
+    cached = st.session_state.get('file_hash')
+    if cached is not None and cached[0] == uploaded_file.file_id:
+        return cached[1]
+
+    # Hash 4 MB slices of the upload's buffer in place; getvalue() would copy
+    # the whole file, and blake2b is faster than SHA-1 in CPython
+    h = hashlib.blake2b(digest_size=16)
+    with uploaded_file.getbuffer() as buf:
+        for start in range(0, len(buf), HASH_CHUNK_SIZE):
+            h.update(buf[start:start + HASH_CHUNK_SIZE])
+    st.session_state.file_hash = (uploaded_file.file_id, h.hexdigest())
+    return st.session_state.file_hash[1]
+
+# Cached volumes are stored as plain (data, affine) arrays, which pickle more
+# cheaply than Nifti1Image objects. Each derived result loads the upload
+# itself, so a hit on it never has to unpickle the raw volume.
+@st.cache_data(show_spinner=False, max_entries=4, ttl=CACHE_TTL)
+def _load_nifti_cached(file_hash, _uploaded_file):
+    import numpy as np
+    from utils.data_processing import validate_nifti
+    nifti_data = validate_nifti(_uploaded_file)
+    return np.asarray(nifti_data.dataobj, dtype=np.float32), nifti_data.affine
+
+def load_nifti(file_hash, uploaded_file):
+    """Return the validated upload as a Nifti1Image"""
+    import nibabel as nib
+    data, affine = _load_nifti_cached(file_hash, uploaded_file)
+    return nib.Nifti1Image(data, affine)
+
+@st.cache_data(show_spinner=False, max_entries=4, ttl=CACHE_TTL)
+def _vbm_cached(file_hash, _uploaded_file):
+    import numpy as np
+    from utils.data_processing import validate_nifti, process_vbm_data
+    # Hand VBM the lazily loaded upload so a 4D file only has its first
+    # volume decoded
+    processed_data = process_vbm_data(validate_nifti(_uploaded_file))
+    return np.asanyarray(processed_data.dataobj), processed_data.affine
+
+# The ALE map and its null distribution don't depend on the p-value, so they
+# are cached per file and only the thresholding reruns when the slider moves
+@st.cache_data(show_spinner=False, max_entries=4, ttl=CACHE_TTL)
+def _ale_map(file_hash, _uploaded_file):
+    from utils.meta_analysis import compute_ale_map
+    nifti_data = load_nifti(file_hash, _uploaded_file)
+    ale_map, null_distributions = compute_ale_map([nifti_data])
+    return ale_map, null_distributions, nifti_data.affine
+
+@st.cache_data(show_spinner=False, max_entries=4, ttl=CACHE_TTL)
+def _ale_preview(file_hash, _uploaded_file):
+    from utils.meta_analysis import compute_ale_preview
+    return compute_ale_preview([load_nifti(file_hash, _uploaded_file)])
+
+@st.cache_data(show_spinner=False, max_entries=4, ttl=CACHE_TTL)
+def _cached_cluster_correction(ale_hash, method, p_threshold, _ale_results):
+    from utils.meta_analysis import apply_cluster_correction
+    return apply_cluster_correction(_ale_results, method=method, p_threshold=p_threshold)
+
+# One pass over the processed volume feeds both the report and the figure
+@st.cache_data(show_spinner=False, max_entries=4, ttl=CACHE_TTL)
+def _cached_volume_stats(data_hash, _data_array, _affine):
+    from utils.statistics import analyze_volume
+    return analyze_volume(_data_array, _affine)
+
+@st.cache_data(show_spinner=False, max_entries=4, ttl=CACHE_TTL)
+def _cached_statistics(data_hash, _data_array, _affine, _volume_stats=None):
+    import nibabel as nib
+    from utils.statistics import generate_statistics_report
+    return generate_statistics_report(nib.Nifti1Image(_data_array, _affine), _volume_stats)
+
+@st.cache_data(show_spinner=False, max_entries=4, ttl=CACHE_TTL)
+def _cached_nifti_bytes(data_hash, _data_array, _affine):
+    from utils.data_processing import nifti_to_bytes
+    return nifti_to_bytes(_data_array, _affine)
+
+# Figures are rasterized once and the PNG bytes cached, which is cheaper to
+# ship to the browser than st.pyplot re-rendering the whole Figure
+@st.cache_data(show_spinner=False, max_entries=16, ttl=CACHE_TTL)
+def _cached_png(data_hash, view_type, colormap, _data_array, _affine, _volume_stats=None):
+    from utils.visualization import render_brain_png
+    display_array, display_affine = _cached_display_volume(data_hash, _data_array, _affine)
+    return render_brain_png(
+        display_array, display_affine, view_type=view_type, colormap=colormap, volume_stats=_volume_stats
+    )
+
+# The display grid only depends on the data, so switching the view or the
+# colormap reuses it instead of having nilearn reorder/resample again
+@st.cache_data(show_spinner=False, max_entries=4, ttl=CACHE_TTL)
+def _cached_display_volume(data_hash, _data_array, _affine):
+    from utils.visualization import prepare_display_volume
+    return prepare_display_volume(_data_array, _affine)
+
+# Repeat literature queries are served from memory instead of hitting the
+# rate-limited APIs; entries expire after an hour so newly indexed papers
+# and maps show up
+@st.cache_data(ttl=SEARCH_CACHE_TTL, show_spinner="Querying PubMed…")
+def _pubmed(query, max_results=20):
+    return search_pubmed(query, max_results=max_results)
+
+@st.cache_data(ttl=SEARCH_CACHE_TTL, show_spinner="Querying NeuroVault…")
+def _neurovault(query):
+    return search_neurovault(query)
+
+def record_search(source, query):
+    """Remember the last query sent to each literature source"""
+    st.session_state[f"last_{source}_search"] = {
+        'query': query,
+        'timestamp': datetime.now().isoformat(timespec='seconds')
+    }
+
 def configure_api_email():
     """Configure email for API access"""
     if not st.session_state.email_configured:
@@ -72,167 +197,355 @@ def run_analysis_tab():
     """Main analysis functionality"""
     st.sidebar.header("Analysis Controls")
     
-    # Analysis type selection
+    # Analysis type selection; kept outside the form because it changes
+    # which controls are shown
     analysis_type = st.sidebar.selectbox(
         "Analysis Type",
         ["Basic Analysis", "Advanced Meta-Analysis"]
     )
     
-    if analysis_type == "Advanced Meta-Analysis":
-        correction_method = st.sidebar.selectbox(
-            "Correction Method",
-            ["None", "FWE", "FDR"]
-        )
-        p_threshold = st.sidebar.slider(
-            "P-value threshold",
-            0.01, 0.10, 0.05, 0.01
+    # The remaining controls are batched in a form so edits (e.g. typing a
+    # title) don't rerun the analysis until they are submitted
+    with st.sidebar.form("analysis_controls"):
+        if analysis_type == "Advanced Meta-Analysis":
+            correction_method = st.selectbox(
+                "Correction Method",
+                ["None", "FWE", "FDR"]
+            )
+            p_threshold = st.slider(
+                "P-value threshold",
+                0.01, 0.10, 0.05, 0.01
+            )
+
+        uploaded_file = st.file_uploader(
+            "Upload NIfTI file (.nii or .nii.gz)",
+            type=['nii', 'nii.gz']
         )
 
-    uploaded_file = st.sidebar.file_uploader(
-        "Upload NIfTI file (.nii or .nii.gz)",
-        type=['nii', 'nii.gz']
-    )
+        # Study information
+        title = st.text_input("Study Title")
+        keywords = st.text_input("Keywords (comma-separated)")
 
-    # Study information
-    title = st.sidebar.text_input("Study Title")
-    keywords = st.sidebar.text_input("Keywords (comma-separated)")
+        # Visualization options
+        st.subheader("Visualization Options")
+        view_type = st.selectbox(
+            "Select view type",
+            ["ortho", "sagittal", "coronal", "axial"]
+        )
+        
+        colormap = st.selectbox(
+            "Color scheme",
+            ["hot", "cold", "RdBu_r", "YlOrRd"]
+        )
 
-    # Visualization options
-    st.sidebar.subheader("Visualization Options")
-    view_type = st.sidebar.selectbox(
-        "Select view type",
-        ["ortho", "sagittal", "coronal", "axial"]
-    )
-    
-    colormap = st.sidebar.selectbox(
-        "Color scheme",
-        ["hot", "cold", "RdBu_r", "YlOrRd"]
-    )
+        submitted = st.form_submit_button("Run Analysis")
 
     st.sidebar.markdown("---")
     st.sidebar.markdown("Built by Tamara Jafar")
     st.sidebar.markdown("Contact Me at tjafar@usc.edu")
     st.sidebar.markdown("Follow me on [Twitter ⭐](https://x.com/TamaraJafar)!")
 
+    # Keep showing results on later reruns once the form has been submitted
+    if submitted:
+        st.session_state.analysis_submitted = True
+
     # **Processing the uploaded file**
-    if uploaded_file is not None:
+    if uploaded_file is not None and st.session_state.get('analysis_submitted'):
         if analysis_type == "Basic Analysis":
             process_uploaded_file(uploaded_file, title, keywords, view_type, colormap)
         elif analysis_type == "Advanced Meta-Analysis":
             process_meta_analysis(uploaded_file, correction_method, p_threshold, view_type, colormap)
 
+def get_cached_render(sig):
+    """Return the last rendered results if they were produced for sig"""
+    if st.session_state.get('last_sig') == sig and 'last_png' in st.session_state:
+        return (
+            st.session_state.last_png,
+            st.session_state.get('last_stats'),
+            st.session_state.get('last_nifti')
+        )
+    return None
+
+def store_render(sig, png, stats_report=None, nifti_bytes=None):
+    """Remember rendered results so unrelated reruns can reuse them"""
+    st.session_state.last_sig = sig
+    st.session_state.last_png = png
+    st.session_state.last_stats = stats_report
+    st.session_state.last_nifti = nifti_bytes
+
 def process_uploaded_file(uploaded_file, title, keywords, view_type, colormap):
     """Process and display uploaded file"""
     try:
-        # Load and validate data
-        nifti_data = validate_nifti(uploaded_file)
-        processed_data = process_vbm_data(nifti_data)
+        # Reuse the last render when neither the data nor the view changed
+        file_hash = get_file_hash(uploaded_file)
+        sig = ('basic', file_hash, view_type, colormap)
+        cached = get_cached_render(sig)
+
+        if cached is None:
+            # Load, validate and process data
+            processed_array, affine = _vbm_cached(file_hash, uploaded_file)
+
+            volume_stats = _cached_volume_stats(file_hash, processed_array, affine)
+
+            png = _cached_png(file_hash, view_type, colormap, processed_array, affine, volume_stats)
+            stats_report = _cached_statistics(file_hash, processed_array, affine, volume_stats)
+            store_render(sig, png, stats_report)
+        else:
+            png, stats_report, _ = cached
 
         # Create visualization
         col1, col2 = st.columns([2, 1])
 
         with col1:
             st.subheader("Brain Visualization")
-            fig = create_brain_visualization(
-                processed_data,
-                view_type=view_type,
-                colormap=colormap
+            st.image(png)
+            st.download_button(
+                "Download Visualization",
+                data=png,
+                file_name="brain_visualization.png",
+                mime="image/png"
             )
-            st.pyplot(fig)
 
         with col2:
             st.subheader("Statistics")
-            stats_report = generate_statistics_report(processed_data)
             st.write(stats_report)
+            st.download_button(
+                "Download Statistics Report",
+                data=stats_report.to_csv(),
+                file_name="statistics_report.csv",
+                mime="text/csv"
+            )
+
+            if st.button("Save Analysis"):
+                if title:
+                    from database import save_analysis
+                    study_id = save_analysis(
+                        uploaded_file,
+                        title,
+                        keywords,
+                        map_type='vbm',
+                        statistics=stats_report.to_json()
+                    )
+                    st.success(f"Analysis saved as study #{study_id}")
+                else:
+                    st.warning("Enter a study title to save the analysis.")
 
     except Exception as e:
         st.error(f"Error processing file: {str(e)}")
 
+# The ALE permutations can take a while, so they run on a worker thread while
+# the script thread shows a coarse preview and polls for completion
+ALE_POLL_INTERVAL = 0.5
+
+def get_ale_job(file_hash, uploaded_file):
+    """Return the running (or finished) ALE job for a file, starting it if needed"""
+    if 'ale_executor' not in st.session_state:
+        st.session_state.ale_executor = ThreadPoolExecutor(max_workers=2)
+    jobs = st.session_state.setdefault('ale_jobs', {})
+    if file_hash not in jobs:
+        # Finished jobs are kept so threshold changes reuse their result;
+        # only the current file's job is worth holding on to
+        for other in [h for h, job in jobs.items() if job.done()]:
+            del jobs[other]
+        # Load on this thread first so the worker hits the cache instead of
+        # reading the upload concurrently with the preview
+        load_nifti(file_hash, uploaded_file)
+        jobs[file_hash] = st.session_state.ale_executor.submit(_ale_map, file_hash, uploaded_file)
+    return jobs[file_hash]
+
+def show_ale_preview(file_hash, uploaded_file, view_type, colormap):
+    """Display a coarse ALE map while the full analysis is running"""
+    preview, affine = _ale_preview(file_hash, uploaded_file)
+    st.info("Running ALE permutations… showing a coarse preview.")
+    st.image(_cached_png(f"{file_hash}:preview", view_type, colormap, preview, affine))
+
 def process_meta_analysis(uploaded_file, correction_method, p_threshold, view_type, colormap):
     """Process advanced meta-analysis"""
+    import numpy as np
+    from utils.meta_analysis import threshold_ale_map
+
     try:
-        # Load and validate data
-        nifti_data = validate_nifti(uploaded_file)
-        
-        # Perform ALE analysis
-        ale_results = perform_ale_analysis([nifti_data], p_threshold=p_threshold)
-        
-        # Apply cluster correction if selected
-        if correction_method in ['FWE', 'FDR']:
-            ale_results = apply_cluster_correction(
-                ale_results, 
-                method=correction_method.lower(),
-                p_threshold=p_threshold
-            )
-        
-        # Create visualization
-        processed_nifti = nib.Nifti1Image(ale_results, nifti_data.affine)
+        # Reuse the last render when neither the data nor the view changed
+        file_hash = get_file_hash(uploaded_file)
+        sig = ('meta', file_hash, correction_method, p_threshold, view_type, colormap)
+        cached = get_cached_render(sig)
+
+        if cached is None:
+            # Load data and perform ALE analysis in the background
+            ale_job = get_ale_job(file_hash, uploaded_file)
+            # A job that only hits the _ale_map cache finishes within the
+            # poll interval, so the preview is only shown for real work
+            wait([ale_job], timeout=ALE_POLL_INTERVAL)
+            if not ale_job.done():
+                show_ale_preview(file_hash, uploaded_file, view_type, colormap)
+                st.rerun()
+            try:
+                ale_map, null_distributions, affine = ale_job.result()
+            except Exception:
+                # Drop a failed job so the next run retries it
+                del st.session_state.ale_jobs[file_hash]
+                raise
+            ale_results = threshold_ale_map(ale_map, null_distributions, p_threshold)
+            
+            # Apply cluster correction if selected
+            if correction_method in ['FWE', 'FDR']:
+                ale_hash = f"{file_hash}:{p_threshold}"
+                ale_results = _cached_cluster_correction(
+                    ale_hash,
+                    correction_method.lower(),
+                    p_threshold,
+                    ale_results
+                )
+            
+            # Create visualization
+            data_hash = f"{file_hash}:{correction_method}:{p_threshold}"
+            ale_results = ale_results.astype(np.float32, copy=False)
+            volume_stats = _cached_volume_stats(data_hash, ale_results, affine)
+            png = _cached_png(data_hash, view_type, colormap, ale_results, affine, volume_stats)
+            nifti_bytes = _cached_nifti_bytes(data_hash, ale_results, affine)
+            store_render(sig, png, nifti_bytes=nifti_bytes)
+        else:
+            png, _, nifti_bytes = cached
         
         col1, col2 = st.columns([2, 1])
         
         with col1:
             st.subheader("Meta-Analysis Results")
-            fig = create_brain_visualization(
-                processed_nifti,
-                view_type=view_type,
-                colormap=colormap
+            st.image(png)
+
+        with col2:
+            st.subheader("Downloads")
+            st.download_button(
+                "Download NIfTI Results",
+                data=nifti_bytes,
+                file_name="meta_analysis_results.nii.gz",
+                mime="application/gzip"
+            )
+            st.download_button(
+                "Download Visualization",
+                data=png,
+                file_name="meta_analysis_results.png",
+                mime="image/png"
             )
-            st.pyplot(fig)
 
     except Exception as e:
         st.error(f"Error in meta-analysis: {str(e)}")
 
+SEARCH_TIMEOUT = 15
+
+def fetch_results(search, query):
+    """Run a literature search and return (results, error)"""
+    try:
+        return search(query), None
+    except Exception as e:
+        return None, e
+
+def search_all(query):
+    """Query PubMed and NeuroVault concurrently"""
+    # Both searches are network-bound, so threads overlap their latency
+    executor = ThreadPoolExecutor(max_workers=2)
+    futures = {
+        'pubmed': executor.submit(fetch_results, _pubmed, query),
+        'neurovault': executor.submit(fetch_results, _neurovault, query)
+    }
+    outcomes = {}
+    for source, future in futures.items():
+        try:
+            outcomes[source] = future.result(timeout=SEARCH_TIMEOUT)
+        except FutureTimeoutError:
+            outcomes[source] = (None, TimeoutError("request timed out"))
+    executor.shutdown(wait=False, cancel_futures=True)
+    return outcomes
+
+def show_pubmed_outcome(query, results, error):
+    """Display the outcome of a PubMed search"""
+    if error is not None:
+        st.error(f"Error searching PubMed: {str(error)}")
+        return
+    record_search('pubmed', query)
+    if results:
+        display_pubmed_results(results)
+    else:
+        st.warning("No PubMed results found.")
+
+def show_neurovault_outcome(query, results, error):
+    """Display the outcome of a NeuroVault search"""
+    if error is not None:
+        st.error(f"Error searching NeuroVault: {str(error)}")
+        return
+    record_search('neurovault', query)
+    if results:
+        display_neurovault_results(results)
+    else:
+        st.warning("No NeuroVault results found.")
+
 def run_literature_search_tab():
     """Literature search functionality"""
     st.header("Literature Search")
     
     search_query = st.text_input("Enter search terms:")
+    if st.button("Clear search cache"):
+        _pubmed.clear()
+        _neurovault.clear()
+        st.success("Cached search results cleared.")
+
+    outcomes = {}
+    if st.button("Search Both") and search_query:
+        with st.spinner("Querying PubMed and NeuroVault…"):
+            outcomes = search_all(search_query)
+
     col1, col2 = st.columns(2)
     
     with col1:
-        if st.button("Search PubMed"):
-            if search_query:
-                try:
-                    results = search_pubmed(search_query)
-                    if results:
-                        display_pubmed_results(results)
-                    else:
-                        st.warning("No PubMed results found.")
-                except Exception as e:
-                    st.error(f"Error searching PubMed: {str(e)}")
+        if st.button("Search PubMed") and search_query:
+            outcomes['pubmed'] = fetch_results(_pubmed, search_query)
+        if 'pubmed' in outcomes:
+            show_pubmed_outcome(search_query, *outcomes['pubmed'])
 
     with col2:
-        if st.button("Search NeuroVault"):
-            if search_query:
-                try:
-                    results = search_neurovault(search_query)
-                    if results:
-                        display_neurovault_results(results)
-                    else:
-                        st.warning("No NeuroVault results found.")
-                except Exception as e:
-                    st.error(f"Error searching NeuroVault: {str(e)}")
+        if st.button("Search NeuroVault") and search_query:
+            outcomes['neurovault'] = fetch_results(_neurovault, search_query)
+        if 'neurovault' in outcomes:
+            show_neurovault_outcome(search_query, *outcomes['neurovault'])
+
+# Result lists are rendered as one cached Markdown block instead of a widget
+# per result, keyed on the result ids
+@st.cache_data(show_spinner=False, max_entries=32)
+def _pubmed_results_markdown(pmids, _results):
+    lines = []
+    for result in _results:
+        pubmed_link = f"https://pubmed.ncbi.nlm.nih.gov/{result['pmid']}"
+        lines.append(
+            f"- **{result['title']}** ({result['year']})  \n"
+            f"  Authors: {result['authors']} · Journal: {result['journal']} · "
+            f"[PMID {result['pmid']}]({pubmed_link})"
+        )
+    return "\n".join(lines)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _neurovault_results_markdown(ids, _results):
+    lines = []
+    for result in _results:
+        neurovault_link = f"https://neurovault.org/images/{result['id']}"
+        lines.append(
+            f"- **{result['title']}**  \n"
+            f"  Map Type: {result['map_type']} · "
+            f"Cognitive Paradigm: {result['cognitive_paradigm_cogatlas']} · "
+            f"[View on NeuroVault]({neurovault_link})"
+        )
+    return "\n".join(lines)
 
 def display_pubmed_results(results):
     """Display PubMed search results"""
     st.subheader("PubMed Results")
-    for result in results:
-        with st.expander(f"{result['title']} ({result['year']})"):
-            st.write(f"Authors: {result['authors']}")
-            st.write(f"Journal: {result['journal']}")
-            st.write(f"PMID: {result['pmid']}")
-            pubmed_link = f"https://pubmed.ncbi.nlm.nih.gov/{result['pmid']}"
-            st.markdown(f"[View on PubMed]({pubmed_link})")
+    pmids = tuple(str(result['pmid']) for result in results)
+    st.markdown(_pubmed_results_markdown(pmids, results))
 
 def display_neurovault_results(results):
     """Display NeuroVault search results"""
     st.subheader("NeuroVault Results")
-    for result in results:
-        with st.expander(f"{result['title']}"):
-            st.write(f"Map Type: {result['map_type']}")
-            st.write(f"Cognitive Paradigm: {result['cognitive_paradigm_cogatlas']}")
-            neurovault_link = f"https://neurovault.org/images/{result['id']}"
-            st.markdown(f"[View on NeuroVault]({neurovault_link})")
+    ids = tuple(result['id'] for result in results)
+    st.markdown(_neurovault_results_markdown(ids, results))
 
 def run_documentation_tab():
     """Display documentation and instructions"""
@@ -262,7 +575,7 @@ def run_documentation_tab():
         st.markdown("""
         **The application requires the following dependencies:**
         ```bash
-        pip install streamlit nibabel nilearn numpy pandas scipy sqlalchemy matplotlib biopython requests
+        pip install streamlit nibabel nilearn numpy pandas scipy sqlalchemy matplotlib biopython requests lxml numba connected-components-3d
         ```
         """)
 
@@ -278,8 +591,9 @@ def run_documentation_tab():
         5. Customize visualization:
            - View type (Ortho/Sagittal/Coronal/Axial)
            - Color scheme
-        6. View results and statistics
-        7. Download visualization or statistics report
+        6. Click **Run Analysis**
+        7. View results and statistics
+        8. Download visualization or statistics report
 
         ### Advanced Meta-Analysis
         1. Select **"Advanced Meta-Analysis"** from Analysis Type
@@ -289,10 +603,11 @@ def run_documentation_tab():
            - **FDR** (False Discovery Rate)
         3. Set **p-value threshold** (0.01-0.10)
         4. Upload **NIfTI file**
-        5. View results:
+        5. Click **Run Analysis**
+        6. View results:
            - Brain visualization
            - Analysis details
-        6. Download results
+        7. Download results
 
         ### Literature Search
         1. Configure **API email** (required for first use)
@@ -300,6 +615,7 @@ def run_documentation_tab():
         3. Choose search type:
            - **PubMed:** For academic papers
            - **NeuroVault:** For brain maps
+           - **Both:** Queries PubMed and NeuroVault at the same time
         4. View and interact with results
         5. Download or visualize related data
         """)
@@ -1,25 +1,124 @@
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import create_engine, event, insert, inspect, text
 from sqlalchemy.orm import sessionmaker
-from models import Base
+from models import Base, Study, BrainMap, Keyword
+from contextlib import contextmanager
+from datetime import datetime
+import gzip
+import hashlib
+import io
 import os
+import tempfile
 
-# Create database engine
+# Create database engine. Streamlit serves sessions from several threads, so
+# connections are pooled and may be checked out on any thread; each session
+# still gets its own connection, keeping transactions isolated.
 DATABASE_URL = "sqlite:///brain_analysis.db"
-engine = create_engine(DATABASE_URL)
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_pre_ping=True
+)
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL journaling and relaxed fsync so commits don't block readers."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.close()
+
+# Uploaded maps are kept on disk, named by their SHA-256, rather than as
+# BLOBs in SQLite
+STORE_DIR = "store"
+GZIP_MAGIC = b'\x1f\x8b'
+
+STUDY_FTS_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS study_fts
+       USING fts5(title, keywords, content='studies', content_rowid='id')""",
+    """CREATE TRIGGER IF NOT EXISTS studies_fts_insert AFTER INSERT ON studies BEGIN
+         INSERT INTO study_fts(rowid, title, keywords) VALUES (new.id, new.title, new.keywords);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS studies_fts_delete AFTER DELETE ON studies BEGIN
+         INSERT INTO study_fts(study_fts, rowid, title, keywords)
+         VALUES ('delete', old.id, old.title, old.keywords);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS studies_fts_update AFTER UPDATE ON studies BEGIN
+         INSERT INTO study_fts(study_fts, rowid, title, keywords)
+         VALUES ('delete', old.id, old.title, old.keywords);
+         INSERT INTO study_fts(rowid, title, keywords) VALUES (new.id, new.title, new.keywords);
+       END""",
+)
 
 # Create sessionmaker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _migrate_brain_map_blobs():
+    """Move maps stored as BLOBs by older versions of the schema into the file store."""
+    inspector = inspect(engine)
+    if not inspector.has_table('brain_maps'):
+        return
+    if 'data_path' in {column['name'] for column in inspector.get_columns('brain_maps')}:
+        return
+
+    # SQLite can't alter the NOT NULL BLOB column away, so the data is
+    # written to the store first, then the table is rebuilt with the current
+    # schema and the rows are written back, all in one transaction
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT id, study_id, map_type, data, statistics, created_at FROM brain_maps")
+        ).mappings().all()
+
+    migrated = []
+    for row in rows:
+        data_path, sha256 = store_file(io.BytesIO(row['data']))
+        migrated.append({
+            'id': row['id'],
+            'study_id': row['study_id'],
+            'map_type': row['map_type'],
+            'data_path': data_path,
+            'sha256': sha256,
+            'statistics': row['statistics'],
+            'created_at': datetime.fromisoformat(row['created_at']) if row['created_at'] else None,
+        })
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE brain_maps")
+        BrainMap.__table__.create(bind=conn)
+        if migrated:
+            conn.execute(insert(BrainMap), migrated)
+
 def init_db():
     """Initialize the database, creating tables only if they don't exist."""
+    # Databases created before maps moved to the file store still have a
+    # brain_maps table with a data BLOB, which create_all would leave alone
+    _migrate_brain_map_blobs()
+
+    # The keyword and full-text indexes only pick up studies saved after
+    # they exist, so note whether they are new and backfill them if so
     inspector = inspect(engine)
+    new_keyword_index = not inspector.has_table('study_keywords')
+    new_fts_index = not inspector.has_table('study_fts')
 
-    # Check if tables already exist
-    existing_tables = inspector.get_table_names()
+    # create_all checks each table before creating it, so partially created
+    # schemas are completed instead of skipped
+    Base.metadata.create_all(bind=engine, checkfirst=True)
 
-    # Only create tables that don't exist
-    if not existing_tables:
-        Base.metadata.create_all(bind=engine)
+    # Full-text index over study titles and keywords, kept in sync with the
+    # studies table by triggers
+    with engine.begin() as conn:
+        for statement in STUDY_FTS_DDL:
+            conn.exec_driver_sql(statement)
+        if new_fts_index:
+            conn.exec_driver_sql("INSERT INTO study_fts(study_fts) VALUES('rebuild')")
+
+    if new_keyword_index:
+        with db_session() as db:
+            for study_id, keywords in db.query(Study.id, Study.keywords):
+                for keyword in _split_keywords(keywords):
+                    db.add(Keyword(study_id=study_id, keyword=keyword))
 
 def get_db():
     """Get a database session."""
@@ -27,4 +126,96 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@contextmanager
+def db_session():
+    """Provide a session that commits on success and rolls back on error."""
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def store_file(file_obj, chunk_size=1 << 20):
+    """Stream a NIfTI file into the content-addressed store as .nii.gz and return (path, sha256)."""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    h = hashlib.sha256()
+    file_obj.seek(0)
+    compressed = file_obj.read(2) == GZIP_MAGIC
+    file_obj.seek(0)
+    with tempfile.NamedTemporaryFile(dir=STORE_DIR, delete=False) as tmp_file:
+        # Uncompressed .nii uploads are gzipped on the way in; fast level-1
+        # gzip already shrinks sparse voxel data several-fold
+        out = tmp_file if compressed else gzip.GzipFile(fileobj=tmp_file, mode='wb', compresslevel=1)
+        with out:
+            for chunk in iter(lambda: file_obj.read(chunk_size), b''):
+                h.update(chunk)
+                out.write(chunk)
+
+    digest = h.hexdigest()
+    path = os.path.join(STORE_DIR, f"{digest}.nii.gz")
+    os.replace(tmp_file.name, path)
+    return path, digest
+
+def _split_keywords(keywords):
+    """Return the normalized (stripped, lower-cased) set of comma-separated keywords."""
+    return {k.strip().lower() for k in (keywords or '').split(',')} - {''}
+
+def save_analysis(file_data, title, keywords=None, map_type='vbm', statistics=None):
+    """Save a study and its brain map, returning the new study id."""
+    data_path, sha256 = store_file(file_data)
+
+    with db_session() as db:
+        study = Study(title=title, keywords=keywords)
+        db.add(study)
+        db.flush()
+        for keyword in _split_keywords(keywords):
+            db.add(Keyword(study_id=study.id, keyword=keyword))
+        db.add(BrainMap(
+            study_id=study.id,
+            map_type=map_type,
+            data_path=data_path,
+            sha256=sha256,
+            statistics=statistics
+        ))
+        return study.id
+
+def load_analysis(brain_map_id):
+    """Open the stored (.nii.gz) NIfTI file of a brain map."""
+    with db_session() as db:
+        brain_map = db.get(BrainMap, brain_map_id)
+        if brain_map is None:
+            raise ValueError(f"No brain map with id {brain_map_id}")
+        return open(brain_map.data_path, 'rb')
+
+def bulk_save_maps(rows):
+    """Insert many brain map rows (dicts of BrainMap columns) in one transaction."""
+    if not rows:
+        return
+    with db_session() as db:
+        db.execute(insert(BrainMap), rows)
+
+def search_studies(query):
+    """Return ids of studies whose title or keywords contain every search term, best first."""
+    # Each term is quoted so user text is never parsed as FTS5 query syntax
+    # (e.g. "fear-amygdala" or a stray quote); quoted terms are ANDed
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    if not terms:
+        return []
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT rowid FROM study_fts WHERE study_fts MATCH :query ORDER BY rank"),
+            {"query": " ".join(terms)}
+        )
+        return [row[0] for row in rows]
+
+def studies_with_keyword(keyword):
+    """Return ids of studies tagged with a keyword, using the keyword index."""
+    with db_session() as db:
+        rows = db.query(Keyword.study_id).filter(Keyword.keyword == keyword.strip().lower())
+        return [study_id for (study_id,) in rows.distinct()]
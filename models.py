@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, LargeBinary
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -17,6 +17,7 @@ class Study(Base):
     
     # Relationships
     brain_maps = relationship("BrainMap", back_populates="study")
+    keyword_entries = relationship("Keyword", back_populates="study")
 
 class BrainMap(Base):
     __tablename__ = 'brain_maps'
@@ -24,9 +25,20 @@ class BrainMap(Base):
     id = Column(Integer, primary_key=True)
     study_id = Column(Integer, ForeignKey('studies.id'))
     map_type = Column(String)  # 'vbm', 'ale', etc.
-    data = Column(LargeBinary, nullable=False)  # Store NIfTI data
+    data_path = Column(String, nullable=False)  # Path of the stored NIfTI file
+    sha256 = Column(String, index=True)  # Content hash; identical uploads share a file
     statistics = Column(String)  # JSON string of statistics
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     study = relationship("Study", back_populates="brain_maps")
+
+class Keyword(Base):
+    __tablename__ = 'study_keywords'
+    
+    id = Column(Integer, primary_key=True)
+    study_id = Column(Integer, ForeignKey('studies.id'), index=True)
+    keyword = Column(String, index=True)  # Normalized: stripped and lower-cased
+    
+    # Relationships
+    study = relationship("Study", back_populates="keyword_entries")
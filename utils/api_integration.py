@@ -1,8 +1,14 @@
 from Bio import Entrez
+from lxml import etree
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+import itertools
 import json
 import tempfile
-import os
+import threading
+import time
 
 # Configure email for PubMed API
 Entrez.email = "your.email@example.com"  # Will be replaced with user's email
@@ -10,32 +16,105 @@ Entrez.email = "your.email@example.com"  # Will be replaced with user's email
 class APIConfig:
     NEUROVAULT_BASE_URL = "https://neurovault.org/api"
     PUBMED_BATCH_SIZE = 100
+    PUBMED_RATE_LIMIT = 3  # requests per second allowed by NCBI without an API key
+    MAX_WORKERS = 8
+    SPOOL_MAX_SIZE = 64 * 1024 * 1024  # downloads larger than this are spooled to disk
 
-def search_pubmed(query, max_results=20):
+class RateLimiter:
     """
-    Search PubMed for neuroimaging studies
+    Space out calls so that at most `rate` start per second across threads
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+_entrez_limiter = RateLimiter(APIConfig.PUBMED_RATE_LIMIT)
+
+# Shared HTTP session so NeuroVault calls reuse pooled keep-alive connections
+# instead of paying a TCP + TLS handshake per request; transient failures and
+# rate limiting are retried with backoff
+USER_AGENT = "NeuroMeta/1.0"
+_SESSION = requests.Session()
+_SESSION.headers['User-Agent'] = USER_AGENT
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+def _fetch_pubmed_batch(pmids):
     """
+    Fetch the Medline records for one batch of PMIDs
+    """
+    _entrez_limiter.wait()
+    handle = Entrez.efetch(db="pubmed", id=pmids, rettype="medline", retmode="xml")
     try:
-        # Search PubMed
-        handle = Entrez.esearch(db="pubmed", term=query, retmax=max_results)
-        results = Entrez.read(handle)
+        return list(iter_pubmed_articles(handle))
+    finally:
         handle.close()
 
-        if not results['IdList']:
-            return []
+def iter_pubmed_articles(source):
+    """
+    Stream the fields shown in the results list out of PubmedArticleSet XML
 
-        # Fetch details for found articles
-        handle = Entrez.efetch(db="pubmed", id=results['IdList'], rettype="medline", retmode="xml")
-        records = Entrez.read(handle)
-        handle.close()
+    Each <PubmedArticle> is discarded once summarized, so memory stays flat
+    regardless of how many records the response holds.
+    """
+    for _, elem in etree.iterparse(source, events=('end',), tag='PubmedArticle'):
+        title = elem.find('MedlineCitation/Article/ArticleTitle')
+        first_author = elem.find('MedlineCitation/Article/AuthorList/Author')
+        yield {
+            'pmid': elem.findtext('MedlineCitation/PMID'),
+            'title': ''.join(title.itertext()) if title is not None else 'N/A',
+            'authors': (first_author.findtext('LastName') if first_author is not None else None) or 'N/A',
+            'year': elem.findtext('MedlineCitation/Article/Journal/JournalIssue/PubDate/Year') or 'N/A',
+            'journal': elem.findtext('MedlineCitation/Article/Journal/Title')
+        }
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
 
-        return [{
-            'pmid': record['MedlineCitation']['PMID'],
-            'title': record['MedlineCitation']['Article']['ArticleTitle'],
-            'authors': record['MedlineCitation']['Article']['AuthorList'][0]['LastName'] if 'AuthorList' in record['MedlineCitation']['Article'] else 'N/A',
-            'year': record['MedlineCitation']['Article']['Journal']['JournalIssue']['PubDate'].get('Year', 'N/A'),
-            'journal': record['MedlineCitation']['Article']['Journal']['Title']
-        } for record in records['PubmedArticle']]
+def iter_pubmed(query, max_results=20):
+    """
+    Yield PubMed search results as each batch of records arrives
+    """
+    # Search PubMed
+    _entrez_limiter.wait()
+    handle = Entrez.esearch(db="pubmed", term=query, retmax=max_results)
+    results = Entrez.read(handle)
+    handle.close()
+
+    if not results['IdList']:
+        return
+
+    # Fetch details for found articles, one efetch per batch of PMIDs;
+    # batches are fetched in parallel within NCBI's rate limit and yielded
+    # in order, so callers can start on the first batch right away
+    pmids = results['IdList']
+    batch_size = APIConfig.PUBMED_BATCH_SIZE
+    batches = [pmids[i:i + batch_size] for i in range(0, len(pmids), batch_size)]
+    executor = ThreadPoolExecutor(max_workers=min(len(batches), APIConfig.MAX_WORKERS))
+    try:
+        for batch in executor.map(_fetch_pubmed_batch, batches):
+            yield from batch
+    finally:
+        # Don't wait on batches nobody will read if the caller stops early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def search_pubmed(query, max_results=20):
+    """
+    Search PubMed for neuroimaging studies
+    """
+    try:
+        return list(itertools.islice(iter_pubmed(query, max_results), max_results))
 
     except Exception as e:
         raise ValueError(f"Error searching PubMed: {str(e)}")
@@ -45,7 +124,7 @@ def search_neurovault(query):
     Search NeuroVault for brain maps
     """
     try:
-        response = requests.get(
+        response = _SESSION.get(
             f"{APIConfig.NEUROVAULT_BASE_URL}/images/",
             params={'name__icontains': query},
             timeout=10
@@ -67,31 +146,38 @@ def search_neurovault(query):
 
 def download_neurovault_map(file_url):
     """
-    Download a brain map from NeuroVault
+    Download a brain map from NeuroVault into a file object
     """
     try:
-        response = requests.get(file_url, timeout=30, stream=True)
+        response = _SESSION.get(file_url, timeout=30, stream=True)
         response.raise_for_status()
         
-        # Create temporary file
-        suffix = '.nii.gz'
-        temp_dir = tempfile.mkdtemp()
-        temp_path = os.path.join(temp_dir, f"map{suffix}")
-        
-        with open(temp_path, 'wb') as tmp_file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    tmp_file.write(chunk)
+        # Typical maps stay in memory; only large ones roll over to disk
+        spooled = tempfile.SpooledTemporaryFile(max_size=APIConfig.SPOOL_MAX_SIZE)
+        for chunk in response.iter_content(chunk_size=1 << 16):
+            if chunk:
+                spooled.write(chunk)
+        spooled.seek(0)
         
-        return temp_path
+        return spooled
 
     except requests.exceptions.RequestException as e:
         raise ValueError(f"Error downloading from NeuroVault: {str(e)}")
     except Exception as e:
         raise ValueError(f"Error processing downloaded map: {str(e)}")
 
+def download_neurovault_maps(file_urls):
+    """
+    Download several brain maps from NeuroVault in parallel
+    """
+    if not file_urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(file_urls), APIConfig.MAX_WORKERS)) as executor:
+        return list(executor.map(download_neurovault_map, file_urls))
+
 def configure_email(email):
     """
     Configure email for PubMed API
     """
     Entrez.email = email
+    _SESSION.headers['User-Agent'] = f"{USER_AGENT} (mailto:{email})"
@@ -1,60 +1,136 @@
 import nibabel as nib
 import numpy as np
 from scipy import ndimage
+import gzip
 import io
-import os
-import tempfile
+from functools import lru_cache
 
-def validate_nifti(file_upload):
+GZIP_MAGIC = b'\x1f\x8b'
+
+def load_nifti_fileobj(fileobj, lazy=False):
     """
-    Validate and load NIfTI file
+    Load a NIfTI image from an open file object (e.g. a downloaded map)
+
+    With lazy=True the image's data stays a proxy that reads from fileobj,
+    which must then stay open until the data has been read.
     """
     try:
-        # Create a temporary file to save the upload
-        suffix = '.nii.gz' if file_upload.name.endswith('.gz') else '.nii'
-        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp_file:
-            # Write uploaded file content to temporary file
-            tmp_file.write(file_upload.getvalue())
-            tmp_file.flush()
+        # Detect gzip from the magic bytes rather than trusting a file name;
+        # the object may have been read before (e.g. by an earlier lazy load)
+        fileobj.seek(0)
+        compressed = fileobj.read(2) == GZIP_MAGIC
+        fileobj.seek(0)
+        if compressed:
+            fileobj = gzip.GzipFile(fileobj=fileobj, mode='rb')
 
-            # Load NIfTI file from temporary file path
-            nifti_data = nib.load(tmp_file.name)
+        # A spooled download that rolled over to disk is a real file, which
+        # nibabel would memory-map; the whole volume is read anyway, and the
+        # mmap path is much slower at applying the scaling
+        file_holder = nib.FileHolder(fileobj=fileobj)
+        nifti_data = nib.Nifti1Image.from_file_map(
+            {'header': file_holder, 'image': file_holder}, mmap=False
+        )
 
-            # Basic validation
-            if len(nifti_data.shape) < 3:
-                raise ValueError("Invalid dimensions: Expected 3D or 4D data")
+        # Basic validation
+        if len(nifti_data.shape) < 3:
+            raise ValueError("Invalid dimensions: Expected 3D or 4D data")
 
-            # Load the data into memory before closing the file
-            nifti_data = nib.Nifti1Image(nifti_data.get_fdata(), nifti_data.affine)
+        if lazy:
+            return nifti_data
 
-        # Clean up temporary file
-        os.unlink(tmp_file.name)
-        return nifti_data
+        # Read the scaled data now, while the file object is still open
+        data_array = np.asarray(nifti_data.dataobj, dtype=np.float32)
+        return nib.Nifti1Image(data_array, nifti_data.affine)
 
     except Exception as e:
         raise ValueError(f"Invalid NIfTI file: {str(e)}")
 
+def validate_nifti(file_upload):
+    """
+    Validate and load NIfTI file
+    """
+    # Decode straight from the upload's in-memory buffer; no temp file. The
+    # upload outlives the image, so the data is left for the caller to read
+    # once, in the dtype and extent it needs.
+    return load_nifti_fileobj(file_upload, lazy=True)
+
+def nifti_to_bytes(data_array, affine, compresslevel=1):
+    """
+    Serialize a volume as gzipped NIfTI (.nii.gz) bytes
+    """
+    raw = nib.Nifti1Image(data_array, affine).to_bytes()
+    return gzip.compress(raw, compresslevel=compresslevel)
+
+@lru_cache(maxsize=None)
+def _gaussian_kernel1d(sigma, truncate=4.0):
+    """
+    Build the 1D Gaussian kernel ndimage.gaussian_filter would use, once per sigma
+    """
+    radius = int(truncate * sigma + 0.5)
+    x = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    return kernel / kernel.sum()
+
+def gaussian_smooth(data_array, sigma, output=None, scratch=None):
+    """
+    Gaussian-smooth an array, as ndimage.gaussian_filter with mode='reflect'
+
+    scratch may be data_array itself when the input is no longer needed.
+    """
+    kernel = _gaussian_kernel1d(sigma)
+    if output is None:
+        output = np.empty_like(data_array)
+    if scratch is None:
+        scratch = np.empty_like(output)
+
+    # One correlate1d pass per axis, alternating between two buffers so the
+    # last pass lands in output
+    buffers = (output, scratch) if data_array.ndim % 2 else (scratch, output)
+    source = data_array
+    for axis in range(data_array.ndim):
+        target = buffers[axis % 2]
+        ndimage.correlate1d(source, kernel, axis=axis, output=target, mode='reflect')
+        source = target
+    return output
+
 def process_vbm_data(nifti_data):
     """
     Process VBM/ALE data for visualization
     """
     try:
-        # Get data array
-        data_array = nifti_data.get_fdata()
+        # Get data array; float32 halves the memory traffic of every pass
+        # below and downstream, and nibabel would otherwise widen to float64.
+        # Handle 4D data (take first volume if multiple volumes exist); the
+        # volume is sliced from the lazy dataobj so only its bytes are read.
+        source = nifti_data.dataobj
+        if len(nifti_data.shape) > 3:
+            data_array = np.asarray(source[..., 0], dtype=np.float32)
+        else:
+            data_array = np.asarray(source, dtype=np.float32)
 
-        # Handle 4D data (take first volume if multiple volumes exist)
-        if len(data_array.shape) > 3:
-            data_array = data_array[:,:,:,0]
+        # Data decoded from a proxy is usually ours to modify; an in-memory
+        # image's array belongs to the caller, and a proxy may hand back a
+        # read-only view of the raw bytes, so those get one working copy
+        if not data_array.flags.writeable or (
+            isinstance(source, np.ndarray) and np.may_share_memory(data_array, source)
+        ):
+            data_array = data_array.copy()
 
         # Basic preprocessing
-        # Normalize data
-        data_array = (data_array - np.min(data_array)) / (np.max(data_array) - np.min(data_array))
+        # Normalize data in place: one min and one max reduction, then a
+        # subtract and a scale that write back into the same buffer
+        data_min = data_array.min()
+        scale = np.float32(1.0) / (data_array.max() - data_min)
+        np.subtract(data_array, data_min, out=data_array)
+        np.multiply(data_array, scale, out=data_array)
 
-        # Apply minimal smoothing
-        data_array = ndimage.gaussian_filter(data_array, sigma=1.0)
+        # Apply minimal smoothing into a preallocated float32 buffer; the
+        # normalized array doubles as the scratch buffer between passes
+        smoothed = np.empty_like(data_array)
+        gaussian_smooth(data_array, sigma=1.0, output=smoothed, scratch=data_array)
 
         # Create processed NIfTI object
-        processed_nifti = nib.Nifti1Image(data_array, nifti_data.affine)
+        processed_nifti = nib.Nifti1Image(smoothed, nifti_data.affine)
 
         return processed_nifti
 
@@ -1,69 +1,222 @@
 
 import numpy as np
 from scipy import ndimage, stats
+from concurrent.futures import ThreadPoolExecutor
+import os
 from nilearn.image import math_img
 import nibabel as nib
+from numba import njit
+import cc3d
 
-def perform_ale_analysis(nifti_maps, fwe_correction=True, p_threshold=0.05):
+# CuPy is optional; when it is installed and a GPU is present the ALE map
+# and its null distribution are computed on the device
+try:
+    import cupy as cp
+    from cupyx.scipy import ndimage as cupy_ndimage
+    HAS_GPU = cp.cuda.runtime.getDeviceCount() > 0
+except Exception:
+    cp = None
+    HAS_GPU = False
+
+# Number of permutations used to build the FWE null distribution
+N_PERMUTATIONS = 1000
+# Memory budget for one batch of null ALE maps, the (batch, n_voxels) float32
+# product; the batch size is derived from it and the number of brain voxels
+NULL_BATCH_BYTES = 256 * 1024 * 1024
+
+def _smooth_maps(stack, sigma):
     """
-    Perform Activation Likelihood Estimation (ALE) meta-analysis
+    Gaussian-smooth each map of an (n_maps, x, y, z) stack, zero-padded at the edges
+    """
+    smoothed = np.empty(stack.shape, dtype=np.float32)
+
+    # Maps are smoothed on parallel threads (ndimage releases the GIL), each
+    # writing straight into its slice of the preallocated stack
+    def smooth(i):
+        ndimage.gaussian_filter(stack[i], sigma=sigma, mode='constant', output=smoothed[i])
+
+    with ThreadPoolExecutor(max_workers=min(len(stack), os.cpu_count() or 1)) as executor:
+        list(executor.map(smooth, range(len(stack))))
+    return smoothed
+
+def _first_volume(nimg, step=1):
+    """
+    Read a map's first 3D volume as float32, keeping every `step`-th voxel
+    """
+    # 4D maps contribute their first volume, as in process_vbm_data; slicing
+    # the lazy dataobj only reads that volume
+    index = (slice(None, None, step),) * 3 + (0,) * (len(nimg.shape) - 3)
+    return np.asarray(nimg.dataobj[index], dtype=np.float32)
+
+def compute_ale_map(nifti_maps, fwe_correction=True, backend='auto'):
+    """
+    Compute the unthresholded ALE map and its FWE null distribution
+
+    The null distribution is None when fwe_correction is False. backend
+    'auto' or 'cupy' runs on the GPU when CuPy and a device are available
+    and falls back to NumPy otherwise; 'numpy' always stays on the CPU.
     """
     try:
-        # Convert maps to common space and get data arrays
-        data_arrays = [nimg.get_fdata() for nimg in nifti_maps]
+        use_gpu = backend in ('auto', 'cupy') and HAS_GPU
+        xp = cp if use_gpu else np
+
+        # Smooth each map once; smoothing is linear, so smoothing a resampled
+        # mean equals averaging the resampled smoothed maps
+        stack = np.stack([_first_volume(nimg) for nimg in nifti_maps])
+        if use_gpu:
+            smoothed = cupy_ndimage.gaussian_filter(
+                cp.asarray(stack), sigma=(0, 3.0, 3.0, 3.0), mode='constant'
+            )
+        else:
+            smoothed = _smooth_maps(stack, 3.0)
+        n_maps = len(smoothed)
         
         # Calculate ALE values
-        ale_values = np.zeros_like(data_arrays[0])
-        for data in data_arrays:
-            # Gaussian smoothing for each map
-            smoothed = ndimage.gaussian_filter(data, sigma=3.0)
-            ale_values += smoothed
+        ale_values = smoothed.mean(axis=0)
         
-        # Normalize ALE values
-        ale_values /= len(data_arrays)
+        if not fwe_correction:
+            return _to_host(ale_values), None
         
-        if fwe_correction:
-            # Perform FWE correction
-            null_distributions = []
-            for _ in range(1000):  # 1000 permutations
-                shuffled = np.random.permutation(data_arrays)
-                null_ale = np.mean([ndimage.gaussian_filter(d, sigma=3.0) 
-                                  for d in shuffled], axis=0)
-                null_distributions.append(np.max(null_ale))
-            
-            # Calculate threshold
-            threshold = np.percentile(null_distributions, (1 - p_threshold) * 100)
-            ale_values[ale_values < threshold] = 0
-            
-        return ale_values
+        # Voxels outside every map are zero in any resampled mean, so only
+        # the brain voxels need to be carried through the null loop
+        brain_mask = xp.any(smoothed != 0, axis=0)
+        masked = smoothed[:, brain_mask]
+        
+        # A permutation of the maps leaves their mean unchanged, so the null
+        # draws maps with replacement (bootstrap). Each draw becomes a row of
+        # map weights, so a batch of null ALE maps is one matrix product.
+        rng = np.random.default_rng()
+        null_distributions = xp.zeros(N_PERMUTATIONS, dtype=np.float32)
+        if masked.shape[1]:
+            batch_size = max(1, min(N_PERMUTATIONS, NULL_BATCH_BYTES // (4 * masked.shape[1])))
+            # The weights and null-map buffers are allocated once and reused
+            # by every batch
+            weights = np.empty((batch_size, n_maps), dtype=np.float32)
+            null_maps = xp.empty((batch_size, masked.shape[1]), dtype=np.float32)
+            for start in range(0, N_PERMUTATIONS, batch_size):
+                batch = min(batch_size, N_PERMUTATIONS - start)
+                # Only map indices are drawn; each row's draw counts, offset
+                # into that row, become its weights in one bincount
+                draws = rng.integers(0, n_maps, size=(batch, n_maps))
+                draws += np.arange(0, batch * n_maps, n_maps)[:, None]
+                np.multiply(
+                    np.bincount(draws.ravel(), minlength=batch * n_maps).reshape(batch, n_maps),
+                    1.0 / n_maps,
+                    out=weights[:batch],
+                    casting='unsafe'
+                )
+                xp.matmul(xp.asarray(weights[:batch]), masked, out=null_maps[:batch])
+                null_maps[:batch].max(axis=1, out=null_distributions[start:start + batch])
+            if not brain_mask.all():
+                xp.maximum(null_distributions, 0, out=null_distributions)
+        
+        return _to_host(ale_values), _to_host(null_distributions)
         
     except Exception as e:
         raise ValueError(f"Error in ALE analysis: {str(e)}")
 
+def _to_host(array):
+    """Return array as a NumPy array, copying it off the GPU if needed"""
+    return cp.asnumpy(array) if cp is not None and isinstance(array, cp.ndarray) else array
+
+def compute_ale_preview(nifti_maps, factor=2):
+    """
+    Compute a quick, unthresholded ALE map on a coarser grid for previews
+
+    Returns the preview map and its affine.
+    """
+    try:
+        # Subsample every `factor`-th voxel and scale the kernel to match
+        data_arrays = np.stack([_first_volume(nimg, step=factor) for nimg in nifti_maps])
+        ale_values = _smooth_maps(data_arrays, 3.0 / factor).mean(axis=0)
+
+        affine = nifti_maps[0].affine.copy()
+        affine[:3, :3] *= factor
+        return ale_values, affine
+
+    except Exception as e:
+        raise ValueError(f"Error in ALE preview: {str(e)}")
+
+def threshold_ale_map(ale_values, null_distributions, p_threshold=0.05):
+    """
+    Zero ALE values below the FWE threshold for the given p-value
+    """
+    try:
+        # Calculate threshold
+        threshold = np.percentile(null_distributions, (1 - p_threshold) * 100)
+        thresholded = ale_values.copy()
+        thresholded[thresholded < threshold] = 0
+        return thresholded
+        
+    except Exception as e:
+        raise ValueError(f"Error in ALE thresholding: {str(e)}")
+
+def perform_ale_analysis(nifti_maps, fwe_correction=True, p_threshold=0.05):
+    """
+    Perform Activation Likelihood Estimation (ALE) meta-analysis
+    """
+    ale_values, null_distributions = compute_ale_map(nifti_maps, fwe_correction)
+    
+    if fwe_correction:
+        # Perform FWE correction
+        ale_values = threshold_ale_map(ale_values, null_distributions, p_threshold)
+        
+    return ale_values
+
+# Serial on purpose: the ALE job and Streamlit reruns call this from worker
+# threads, and numba's parallel runtime (TBB in particular) can hang the
+# process at exit when first started off the main thread
+@njit(cache=True)
+def _zero_rejected_clusters(stat_map, labels, keep):
+    """Zero every voxel whose cluster label is not marked in keep"""
+    for i in range(stat_map.size):
+        if not keep[labels[i]]:
+            stat_map[i] = 0
+
+# Compile the kernels on a tiny volume at import so the first analysis
+# doesn't pay the JIT cost
+_zero_rejected_clusters(np.zeros(1, dtype=np.float32), np.zeros(1, dtype=np.uint32), np.ones(1, dtype=np.bool_))
+
 def apply_cluster_correction(stat_map, method='fwe', p_threshold=0.05):
     """
     Apply cluster-level correction (FWE or FDR)
     """
     try:
-        # Get connected components
-        labeled_array, num_features = ndimage.label(stat_map > 0)
-        cluster_sizes = [np.sum(labeled_array == i) for i in range(1, num_features + 1)]
+        stat_map = np.ascontiguousarray(stat_map)
+        
+        # Get connected components (face connectivity, as ndimage.label);
+        # cc3d only handles up to 3D, so higher-rank maps use ndimage.label
+        if stat_map.ndim > 3:
+            labeled_array, num_features = ndimage.label(stat_map > 0)
+        else:
+            labeled_array, num_features = cc3d.connected_components(
+                (stat_map > 0).view(np.uint8), connectivity=6, return_N=True, out_dtype=np.uint32
+            )
+        if num_features == 0:
+            return stat_map
+        cluster_sizes = np.bincount(labeled_array.ravel(), minlength=num_features + 1)[1:]
+        
+        # Per-label lookup table for the zeroing kernel; label 0 is
+        # background and is left untouched
+        keep = np.ones(num_features + 1, dtype=np.bool_)
         
         if method.lower() == 'fwe':
             # FWE correction
             size_threshold = np.percentile(cluster_sizes, (1 - p_threshold) * 100)
-            for i, size in enumerate(cluster_sizes, 1):
-                if size < size_threshold:
-                    stat_map[labeled_array == i] = 0
+            np.greater_equal(cluster_sizes, size_threshold, out=keep[1:])
                     
         elif method.lower() == 'fdr':
-            # FDR correction
-            p_values = [1 - stats.norm.cdf(size) for size in cluster_sizes]
-            _, corrected_p = stats.fdrcorrection(p_values, alpha=p_threshold)
+            # FDR correction; sf is 1 - cdf without the cancellation, and
+            # false_discovery_control gives Benjamini-Hochberg adjusted p-values
+            p_values = stats.norm.sf(cluster_sizes.astype(np.float64))
+            corrected_p = stats.false_discovery_control(p_values, method='bh')
+            np.less_equal(corrected_p, p_threshold, out=keep[1:])
             
-            for i, p in enumerate(corrected_p, 1):
-                if p > p_threshold:
-                    stat_map[labeled_array == i] = 0
+        else:
+            return stat_map
+        
+        # One pass over the volume, however many clusters there are
+        _zero_rejected_clusters(stat_map.reshape(-1), labeled_array.reshape(-1), keep)
                     
         return stat_map
         
@@ -1,20 +1,19 @@
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from nilearn import plotting
+from nilearn.image import reorder_img
 import numpy as np
+import nibabel as nib
+import io
 
-def create_brain_visualization(nifti_data, view_type='ortho', colormap='hot'):
+def create_brain_visualization(nifti_data, view_type='ortho', colormap='hot', volume_stats=None):
     """
     Create brain visualization using Nilearn
     """
     try:
-        # Set up the backend
-        plt.switch_backend('agg')
-
-        # Clear any existing plots
-        plt.close('all')
-
-        # Create figure with specific size
-        fig = plt.figure(figsize=(12, 8))
+        # Create figure with specific size. The Figure is built without
+        # pyplot so concurrent Streamlit sessions don't share (or close) each
+        # other's figures through pyplot's global state.
+        fig = Figure(figsize=(12, 8))
 
         # Set up display parameters
         display_params = {
@@ -25,6 +24,16 @@ def create_brain_visualization(nifti_data, view_type='ortho', colormap='hot'):
             'figure': fig
         }
 
+        # Cut the ortho view through the peak found by analyze_volume, which
+        # spares nilearn its own search over the volume for cut coordinates.
+        # Ortho takes a single (x, y, z) point rather than a cut count, so
+        # without one nilearn picks the cuts itself.
+        if view_type == 'ortho':
+            if volume_stats is not None and 'peak_coords' in volume_stats:
+                display_params['cut_coords'] = volume_stats['peak_coords']
+            else:
+                display_params['cut_coords'] = None
+
         # Create visualization based on view type
         if view_type == 'ortho':
             plotting.plot_stat_map(
@@ -52,13 +61,45 @@ def create_brain_visualization(nifti_data, view_type='ortho', colormap='hot'):
             )
 
         # Add title
-        plt.title(f"Brain Visualization - {view_type.capitalize()} View")
+        fig.gca().set_title(f"Brain Visualization - {view_type.capitalize()} View")
 
         # Tight layout to prevent cutting off
-        plt.tight_layout()
+        fig.tight_layout()
 
         return fig
 
     except Exception as e:
-        plt.close('all')  # Clean up on error
-        raise ValueError(f"Error creating visualization: {str(e)}")
\ No newline at end of file
+        raise ValueError(f"Error creating visualization: {str(e)}")
+
+def prepare_display_volume(data_array, affine):
+    """
+    Reorder a volume onto the axis-aligned grid nilearn plots on
+    """
+    # nilearn does this on every plot, resampling rotated (oblique) volumes
+    # from scratch; doing it once lets every view and colormap of the same
+    # data reuse the result
+    display_img = reorder_img(
+        nib.Nifti1Image(data_array, affine, dtype=data_array.dtype), resample='continuous'
+    )
+    return np.asarray(display_img.dataobj, dtype=np.float32), display_img.affine
+
+def create_brain_visualization_arr(data_array, affine, view_type='ortho', colormap='hot', volume_stats=None):
+    """
+    Create brain visualization from a data array and its affine
+    """
+    # Wrap the array as-is; going through get_fdata() would make a float64 copy
+    nifti_data = nib.Nifti1Image(data_array, affine, dtype=data_array.dtype)
+    return create_brain_visualization(
+        nifti_data, view_type=view_type, colormap=colormap, volume_stats=volume_stats
+    )
+
+def render_brain_png(data_array, affine, view_type='ortho', colormap='hot', dpi=110, volume_stats=None):
+    """
+    Render a brain visualization to PNG bytes
+    """
+    fig = create_brain_visualization_arr(
+        data_array, affine, view_type=view_type, colormap=colormap, volume_stats=volume_stats
+    )
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+    return buf.getvalue()